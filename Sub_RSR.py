@@ -10,6 +10,8 @@ import argparse
 import os
 import math
 import threading
+import queue
+from collections import deque
 import pyttsx3
 import time
 import warnings
@@ -18,6 +20,9 @@ import json
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 from subscription_management_ins import *
 from subscription_management import *
+from compressed_svm import MODES, load_compressed_model
+from sign_tracker import SignTracker
+from frame_bus import FrameBus
 CONFIG_FILE = 'subscription_config.json'
 
 def load_subscription_data():
@@ -33,12 +38,6 @@ def load_subscription_data():
             'expiry_time': None
         }
 
-# Update subscription status first
-update_subscription_status()
-subscription_data = load_subscription_data_IS()
-subscription_status = subscription_data['subscription_status']
-print(f"Current subscription status speed assist: {subscription_status}")
-
 CONFIG_FILE_INS = 'ins_subscription_config.json'
 
 def load_subscription_data_ins():
@@ -54,10 +53,24 @@ def load_subscription_data_ins():
             'expiry_time_ins': None
         }
 
-update_subscription_status_ins()
-subscription_data_ins = load_subscription_data_ins()
-subscription_status_ins = subscription_data_ins['subscription_status_ins']
-print(f"Current subscription status insurance companion: {subscription_status_ins}")
+# Read by load_subscriptions() when a program starts, not on import, so modules that only
+# use the detection functions do not touch the subscription files.
+subscription_status = False
+subscription_status_ins = False
+
+def load_subscriptions():
+    """Expire old subscriptions, then read the speed assist and insurance companion status."""
+    global subscription_status, subscription_status_ins
+    update_subscription_status()
+    subscription_data = load_subscription_data_IS()
+    subscription_status = subscription_data['subscription_status']
+    print(f"Current subscription status speed assist: {subscription_status}")
+
+    update_subscription_status_ins()
+    subscription_data_ins = load_subscription_data_ins()
+    subscription_status_ins = subscription_data_ins['subscription_status_ins']
+    print(f"Current subscription status insurance companion: {subscription_status_ins}")
+    return subscription_status, subscription_status_ins
 
 
 indiacator = False
@@ -77,20 +90,32 @@ def calculate_lane_distance_ratio(lines):
             return (x2 - x1) / len(lines)
     return None
 
+def split_lines(hough_lines):
+    left_lines, right_lines = [], []
+    for line in hough_lines:
+        x1, y1, x2, y2 = line[0]
+        if (y2 - y1) / (x2 - x1) < 0: 
+            left_lines.append(line)
+        else:
+            right_lines.append(line)
+    return left_lines, right_lines
+
+def lane_distance_ratio_of(hough_lines):
+    if hough_lines is not None and len(hough_lines) > 0:
+        left_lines, right_lines = split_lines(hough_lines)
+        return calculate_lane_distance_ratio(left_lines + right_lines)
+    return None
+
 def draw_lines(image, hough_lines, width, height, warning_threshold):
     if hough_lines is not None and len(hough_lines) > 0:
    
-        left_lines, right_lines = [], []
-        for line in hough_lines:
+        left_lines, right_lines = split_lines(hough_lines)
+        for line in left_lines:
             x1, y1, x2, y2 = line[0]
-            if (y2 - y1) / (x2 - x1) < 0: 
-                left_lines.append(line)
-                color = (0, 0, 255)
-            else:
-                right_lines.append(line)
-                color = (0, 255, 0)
-
-            cv2.line(image, (x1, y1), (x2, y2), color, 2)
+            cv2.line(image, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        for line in right_lines:
+            x1, y1, x2, y2 = line[0]
+            cv2.line(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
         lane_distance_ratio = calculate_lane_distance_ratio(left_lines + right_lines)
        
 
@@ -105,32 +130,60 @@ def draw_lines(image, hough_lines, width, height, warning_threshold):
 
 
 
-def process_lane_detection(img, consecutive_frames, warning_threshold):
-    height, width, _ = img.shape
+def lane_gray(img):
+    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.dilate(gray_img, kernel=np.ones((3, 3), np.uint8))
+
+def lane_edges(gray_img, canny_low=130, canny_high=220):
+    height, width = gray_img.shape
     
     roi_vertices = [
         (0, 850),
         (2 * width / 3, 2 * height / 3),
         (width, height)
     ]
-    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray_img = cv2.dilate(gray_img, kernel=np.ones((3, 3), np.uint8))
-    canny = cv2.Canny(gray_img, 130, 220)
-    roi_img = roi(canny, np.array([roi_vertices], np.int32))
-    lines = cv2.HoughLinesP(roi_img, 1, np.pi / 180, threshold=10, minLineLength=15, maxLineGap=2.5)
-    img_with_lines, lane_distance_ratio = draw_lines(img.copy(), lines, width, height, warning_threshold)
+    canny = cv2.Canny(gray_img, canny_low, canny_high)
+    return roi(canny, np.array([roi_vertices], np.int32))
 
+def lane_lines(roi_img, hough_threshold=10, min_line_length=15, max_line_gap=2.5):
+    return cv2.HoughLinesP(roi_img, 1, np.pi / 180, threshold=hough_threshold, minLineLength=min_line_length, maxLineGap=max_line_gap)
+
+def lane_warning(consecutive_frames, warning_threshold):
+    return all(frame is not None and frame < warning_threshold for frame in consecutive_frames)
+
+def lane_departure(consecutive_frames, lane_distance_ratio, warning_threshold):
+    """Add the frame's ratio to the window and tell if the whole window is under the threshold."""
     consecutive_frames.append(lane_distance_ratio)
     if len(consecutive_frames) > 8:
-        consecutive_frames.pop(0)
+        del consecutive_frames[0]
         
-    if all(frame is not None and frame < warning_threshold for frame in consecutive_frames):
+    return lane_warning(consecutive_frames, warning_threshold)
+
+def detect_lanes(img, consecutive_frames, warning_threshold, canny_low=130, canny_high=220, hough_threshold=10, min_line_length=15, max_line_gap=2.5):
+    """Hough lines of the frame and whether the lane departure warning is on."""
+    roi_img = lane_edges(lane_gray(img), canny_low, canny_high)
+    lines = lane_lines(roi_img, hough_threshold, min_line_length, max_line_gap)
+    return lines, lane_departure(consecutive_frames, lane_distance_ratio_of(lines), warning_threshold)
+
+def draw_lane_detection(img, lines, warning, warning_threshold):
+    height, width, _ = img.shape
+    img_with_lines, lane_distance_ratio = draw_lines(img.copy(), lines, width, height, warning_threshold)
+
+    if warning:
         cv2.putText(img_with_lines, "Warning: Lane Departure", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
 
     return img_with_lines
 
+def process_lane_detection(img, consecutive_frames, warning_threshold, canny_low=130, canny_high=220, hough_threshold=10, min_line_length=15, max_line_gap=2.5):
+    lines, warning = detect_lanes(img, consecutive_frames, warning_threshold, canny_low, canny_high, hough_threshold, min_line_length, max_line_gap)
+    return draw_lane_detection(img, lines, warning, warning_threshold)
+
 SIZE = 32
 
+# Next to this file, so the model loads whatever the working directory is.
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_svm.dat")
+LABELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "labels.txt")
+
 def load_model(filename):
     model = cv2.ml.SVM_load(filename)
     return model
@@ -166,29 +219,74 @@ def get_hog():
 
     return hog
 
-def getLabel(model, data):
+def compute_hog(data):
     gray = cv2.cvtColor(data, cv2.COLOR_BGR2GRAY)
     img = [cv2.resize(gray,(SIZE,SIZE))]
     img_deskewed = list(map(deskew, img))
     hog = get_hog()
     hog_descriptors = np.array([hog.compute(img_deskewed[0])])
     hog_descriptors = np.reshape(hog_descriptors, [-1, hog_descriptors.shape[1]])
+    return hog_descriptors
+
+def getLabel(model, data):
+    hog_descriptors = compute_hog(data)
     return int(model.predict(hog_descriptors)[1][0][0])
 
+def getLabels(model, signs):
+    """Classify several sign crops with a single predict call."""
+    hog_descriptors = np.vstack([compute_hog(sign) for sign in signs])
+    return [int(label) for label in model.predict(hog_descriptors)[1].ravel()]
+
 def run_speech(speech, speech_message):
     speech.say(speech_message)
     speech.runAndWait()
 
-def play_sound_for_sign(speech, sign_name, cooldown_duration, last_detection_time):
+class SpeechWorker:
+    """Speaks queued messages one after another on a single thread that owns the TTS engine."""
+
+    def __init__(self, speech):
+        self.speech = speech
+        self.messages = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def say(self, message):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.messages.put(message)
+
+    def run(self):
+        while True:
+            message = self.messages.get()
+            if message is None:
+                break
+            run_speech(self.speech, message)
+
+    def stop(self):
+        with self.lock:
+            if self.thread is not None:
+                self.messages.put(None)
+                self.thread.join()
+                self.thread = None
+
+def play_sound_for_sign(speech_worker, sign_name, cooldown_duration, last_detection_time):
     current_time = time.time()
     if current_time - last_detection_time > cooldown_duration:
         message = f"Detected sign: {sign_name}"
-        p = threading.Thread(target=run_speech, args=(speech, message))
-        p.start()
+        speech_worker.say(message)
         last_detection_time = current_time
     return last_detection_time
 
-speech = pyttsx3.init()
+speech_worker = None
+
+def get_speech_worker():
+    """The shared speech worker. The TTS engine is started on first use."""
+    global speech_worker
+    if speech_worker is None:
+        speech_worker = SpeechWorker(pyttsx3.init())
+    return speech_worker
 
 
 SIGNS = ["ERROR",
@@ -261,17 +359,6 @@ def contourIsSign(perimeter, centroid, threshold):
     else:                
         return False, max_value + 2
 
-#crop sign 
-def cropContour(image, center, max_distance):
-    width = image.shape[1]
-    height = image.shape[0]
-    top = max([int(center[0] - max_distance), 0])
-    bottom = min([int(center[0] + max_distance + 1), height-1])
-    left = max([int(center[1] - max_distance), 0])
-    right = min([int(center[1] + max_distance+1), width-1])
-    print(left, right, top, bottom)
-    return image[left:right, top:bottom]
-
 def cropSign(image, coordinate):
     width = image.shape[1]
     height = image.shape[0]
@@ -282,59 +369,27 @@ def cropSign(image, coordinate):
     return image[top:bottom,left:right]
 
 
-def findLargestSign(image, contours, threshold, distance_threshold):
-    max_distance = 0
-    coordinate = None
-    sign = None
-
-    for i, c in enumerate(contours):
-        
-
+def findAllSigns(image, contours, threshold, distance_threshold):
+    signs = []
+    for c in contours:
         M = cv2.moments(c)
         if M["m00"] == 0:
             continue
-
         cX = int(M["m10"] / M["m00"])
         cY = int(M["m01"] / M["m00"])
-
         is_sign, distance = contourIsSign(c, [cX, cY], 1 - threshold)
-        #print(f"Contour {i} is_sign: {is_sign}, distance: {distance}")
-
-        if is_sign and distance > max_distance and distance > distance_threshold:
-            max_distance = distance
+        if is_sign and distance > distance_threshold:
             coordinate = np.reshape(c, [-1, 2])
             left, top = np.amin(coordinate, axis=0)
             right, bottom = np.amax(coordinate, axis=0)
             coordinate = [(left - 2, top - 2), (right + 3, bottom + 1)]
             sign = cropSign(image, coordinate)
+            if sign.size > 0:
+                signs.append((sign, coordinate))
+    return signs
 
-    if sign is None:
-        pass
-    return sign, coordinate
-
-
-
-
-def findSigns(image, contours, threshold, distance_theshold):
-    signs = []
-    coordinates = []
-    for c in contours:
-        M = cv2.moments(c)
-        if M["m00"] == 0:
-            continue
-        cX = int(M["m10"] / M["m00"])
-        cY = int(M["m01"] / M["m00"])
-        is_sign, max_distance = contourIsSign(c, [cX, cY], 1-threshold)
-        if is_sign and max_distance > distance_theshold:
-            sign = cropContour(image, [cX, cY], max_distance)
-            signs.append(sign)
-            coordinate = np.reshape(c, [-1,2])
-            top, left = np.amin(coordinate, axis=0)
-            right, bottom = np.amax(coordinate, axis = 0)
-            coordinates.append([(top-2,left-2),(right+1,bottom+1)])
-    return signs, coordinates
-
-def localization(image, min_size_components, similitary_contour_with_circle, model, count, current_sign_type):
+def localizeSigns(image, min_size_components, similitary_contour_with_circle, model, display=True):
+    """Classify every sign shaped contour. Returns [(coordinate, sign_type, text)] and a copy of the image to draw on."""
     original_image = image.copy()
     binary_image = preprocess_image(image)
 
@@ -342,24 +397,18 @@ def localization(image, min_size_components, similitary_contour_with_circle, mod
 
     binary_image = cv2.bitwise_and(binary_image,binary_image, mask=remove_other_color(image))
 
-    cv2.imshow('BINARY IMAGE', binary_image)
+    if display:
+        cv2.imshow('BINARY IMAGE', binary_image)
     contours = findContour(binary_image)
-    sign, coordinate = findLargestSign(original_image, contours, similitary_contour_with_circle, 15)
-    
-    text = ""
-    sign_type = -1
-    i = 0
 
-    if sign is not None:
-        sign_type = getLabel(model, sign)
+    detections = []
+    signs = findAllSigns(original_image, contours, similitary_contour_with_circle, 15)
+    if not signs:
+        return detections, original_image
+    for (sign, coordinate), sign_type in zip(signs, getLabels(model, [sign for sign, _ in signs])):
         sign_type = sign_type if sign_type <= 8 else 8
-        text = SIGNS[sign_type]
-
-    if sign_type > 0 and sign_type != current_sign_type:        
-        cv2.rectangle(original_image, coordinate[0],coordinate[1], (0, 255, 0), 1)
-        font = cv2.FONT_HERSHEY_PLAIN
-        cv2.putText(original_image,text,(coordinate[0][0], coordinate[0][1] -15), font, 1,(0,0,255),2,cv2.LINE_4)
-    return coordinate, original_image, sign_type, text
+        detections.append((coordinate, sign_type, SIGNS[sign_type]))
+    return detections, original_image
 
 def remove_line(img):
     gray = img.copy()
@@ -423,14 +472,169 @@ def remove_other_color(img):
     return mask
 
 
-def main(args):
-    consecutive_frames=[]
-    warning_threshold=0.2
+def load_sign_model(args):
+    model = load_model(MODEL_FILE)
+    if args.compressed_model != "none":
+        model = load_compressed_model(model, MODEL_FILE, args.compressed_model, args.compression_ratio)
+    return model
+
+class SilentSpeech:
+    """Stands in for SpeechWorker where alerts should not be spoken."""
+
+    def say(self, message):
+        pass
+
+class StreamState:
+    """Everything main keeps between the frames of one camera."""
+
+    def __init__(self, name="front"):
+        self.name = name
+        self.consecutive_frames = deque(maxlen=8)
+        self.warning_threshold = 0.2
+        self.tracker = SignTracker()
+        self.count = 0
+        self.sign_count = 0
+        # Only the recent positions are kept so long drives do not grow memory.
+        self.coordinates = deque(maxlen=1000)
+        self.frame_positions = []
+        self.position = []
+        self.last_detection_time = 0
+        # Static scene gate: thumbnail and outputs of the last full pass.
+        self.thumbnail = None
+        self.skipped_frames = 0
+        self.last_positions = []
+        self.last_detections = []
+        self.lane_lines = None
+        self.lane_warning = False
+
+def scene_thumbnail(frame):
+    """Small grayscale copy of the frame, cheap enough to compare on every frame.
+
+    Each cell averages about 11x10 pixels of the 720x480 frame, finer than the smallest sign
+    contour, so a sign appearing or moving a few pixels still changes some cells.
+    """
+    small = cv2.resize(frame, (64, 48), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+def scene_is_static(state, thumbnail, threshold, max_skipped_frames):
+    """True when no thumbnail cell changed much since the last fully processed frame and a full pass is not yet due.
+
+    The largest cell change is used rather than the mean, which a small sign or a slow pan
+    barely moves.
+    """
+    if threshold <= 0 or state.thumbnail is None or state.skipped_frames >= max_skipped_frames:
+        return False
+    return cv2.minMaxLoc(cv2.absdiff(thumbnail, state.thumbnail))[1] < threshold
+
+def draw_detections(image, detections):
+    for coordinate, sign_type, text in detections:
+        cv2.rectangle(image, coordinate[0],coordinate[1], (255, 255, 255), 1)
+
+def draw_tracks(image, tracks):
+    for track in tracks:
+        left, top, right, bottom = track.box
+        cv2.rectangle(image, (left, top),(right, bottom), (0, 255, 0), 1)
+        font = cv2.FONT_HERSHEY_PLAIN
+        cv2.putText(image,track.text,(left, top -15), font, 1,(0,0,255),2,cv2.LINE_4)
+
+def process_frame(state, frame, model, args, speech_worker, cooldown_duration=7, display=True):
+    """Run lane and sign detection on one captured frame.
+
+    Returns the lane/sign overlay shown on screen and the annotated frame that is recorded.
+    """
+    frame = cv2.resize(frame, (720,480))
+
+    # Stopped at a light or in a jam: reuse the last lane lines, detections and tracked boxes,
+    # drawn on the current frame so the recording stays live.
+    thumbnail = scene_thumbnail(frame)
+    if scene_is_static(state, thumbnail, args.static_threshold, args.max_skipped_frames):
+        state.skipped_frames += 1
+        frame_with_lane_detection = draw_lane_detection(frame, state.lane_lines, state.lane_warning, state.warning_threshold)
+        image = frame.copy()
+        draw_detections(image, state.last_detections)
+        draw_tracks(image, state.tracker.tracks)
+        state.frame_positions = []
+        for position in state.last_positions:
+            state.position = [state.count] + position[1:]
+            state.sign_count += 1
+            state.coordinates.append(state.position)
+            state.frame_positions.append(state.position)
+        state.count = state.count + 1
+        return cv2.addWeighted(frame_with_lane_detection, 0.5, image, 0.5, 0), image
+    state.thumbnail = thumbnail
+    state.skipped_frames = 0
+
+    state.lane_lines, state.lane_warning = detect_lanes(frame, state.consecutive_frames, state.warning_threshold)
+    frame_with_lane_detection = draw_lane_detection(frame, state.lane_lines, state.lane_warning, state.warning_threshold)
+    
+    detections, image = localizeSigns(frame, args.min_size_components, args.similitary_contour_with_circle, model, display)
+    draw_detections(image, detections)
+    state.last_detections = detections
     
-    model = load_model(".\data_svm.dat")
-    labels = load_labels('.\labels.txt')
+    
+    #For speed sense
+    #"""
+    if subscription_status == True:
+        totalsign = 0
+    else:
+        totalsign = 8 #(total numbers of non speed sign)
+        
+    detections = [d for d in detections if d[1] > 0 and d[1] < totalsign]
+    #"""
+
+    tracks, new_tracks = state.tracker.update(frame, detections)
+    draw_tracks(image, tracks)
+    state.frame_positions = []
+
+    for track in tracks:
+        left, top, right, bottom = track.box
+        state.position = [state.count, track.sign_type, left, top, right, bottom]
+        state.sign_count += 1
+        state.coordinates.append(state.position)
+        state.frame_positions.append(state.position)
+
+    if tracks:
+        newest = new_tracks[-1] if new_tracks else max(tracks, key=lambda track: track.track_id)
+        state.last_detection_time = play_sound_for_sign(speech_worker, newest.text, cooldown_duration, state.last_detection_time)
+    combined_frame = cv2.addWeighted(frame_with_lane_detection, 0.5, image, 0.5, 0)
+    state.last_positions = state.frame_positions
+    state.count = state.count + 1
+    return combined_frame, image
+
+def describe(state):
+    """Detections of the last processed frame as plain Python values."""
+    return {
+        'frame': state.count - 1,
+        'lane_warning': bool(state.lane_warning),
+        'tracks': [
+            {'track_id': track.track_id, 'sign_type': int(track.sign_type), 'text': track.text, 'box': [int(value) for value in track.box]}
+            for track in state.tracker.tracks
+        ],
+    }
+
+def add_detection_arguments(parser):
+    parser.add_argument('--min_size_components', type=int, default=300, help="Min size component to be reserved")
+    parser.add_argument('--similitary_contour_with_circle', type=float, default=0.60, help="Similarity to a circle")
+    parser.add_argument('--compressed_model', choices=["none"] + MODES, default="none", help="Use a faster approximation of the sign classifier")
+    parser.add_argument('--compression_ratio', type=float, default=0.5, help="Fraction of support vectors kept by the compressed classifier, lower is faster and less accurate")
+    parser.add_argument('--static_threshold', type=float, default=5.0, help="Gray level change of every thumbnail cell below which a frame reuses the last result, 0 to process every frame")
+    parser.add_argument('--max_skipped_frames', type=int, default=15, help="Force a full pass after this many reused frames")
+    parser.add_argument('--no_display', dest='display', action='store_false', help="Do not open preview windows")
+    parser.add_argument('--no_record', dest='record', action='store_false', help="Do not save the annotated video")
+
+def main(args, vidcap=None, on_frame=None):
+    """Run the detection loop.
+
+    vidcap defaults to the first camera. on_frame(state) is called after every frame and
+    stops the loop by returning False.
+    """
+    load_subscriptions()
+    speech_worker = get_speech_worker()
+    model = load_sign_model(args)
+    labels = load_labels(LABELS_FILE)
     #vidcap = cv2.VideoCapture(args.file_name)
-    vidcap = cv2.VideoCapture(0)
+    if vidcap is None:
+        vidcap = cv2.VideoCapture(0)
 
     fps = vidcap.get(cv2.CAP_PROP_FPS)
     width = vidcap.get(3)  
@@ -439,135 +643,61 @@ def main(args):
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    if subscription_status_ins == True:
+    recording = subscription_status_ins == True and args.record
+    if recording:
         out = cv2.VideoWriter(f".\front_adas_{timestamp}.avi",fourcc, fps, (720,480))
         print("Save started")
     else:
         pass
 
-    termination = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
-    roiBox = None
-    roiHist = None
-
-    success = True
-    similitary_contour_with_circle = 0.60  # parameter
-    count = 0
-    current_sign = None
-    current_text = ""
-    current_size = 0
-    sign_count = 0
-    coordinates = []
-    position = []
+    state = StreamState("front")
     file = open("Output.txt", "w")
     
-    cooldown_duration = 7 
-    last_detection_time = 0
-    
+    # Shared memory buses for consumers in other processes, see frame_consumers.py.
+    frame_bus = getattr(args, 'frame_bus', None)
+    raw_bus = None
+    annotated_bus = None
 
-    while True:
-        success,frame = vidcap.read()
-        if not success:
-            #print("FINISHED")
-            break
-        width = frame.shape[1]
-        height = frame.shape[0]
-        frame = cv2.resize(frame, (720,480))
-        frame_with_lane_detection = process_lane_detection(frame, consecutive_frames, warning_threshold)
-        
-        coordinate, image, sign_type, text = localization(frame, args.min_size_components, args.similitary_contour_with_circle, model, count, current_sign)
-        if coordinate is not None:
-            cv2.rectangle(image, coordinate[0],coordinate[1], (255, 255, 255), 1)
-        
-        
-        #For speed sense
-        #"""
-        if subscription_status == True:
-            totalsign = 0
-        else:
-            totalsign = 8 #(total numbers of non speed sign)
-            
-        if sign_type > 0 and (not current_sign or sign_type != current_sign) and sign_type< totalsign:
-    
-        #"""
-        
-        #if sign_type > 0 and (not current_sign or sign_type != current_sign):
-            current_sign = sign_type
-            current_text = text
-            top = int(coordinate[0][1]*1.05)
-            left = int(coordinate[0][0]*1.05)
-            bottom = int(coordinate[1][1]*0.95)
-            right = int(coordinate[1][0]*0.95)
-
-            position = [count, sign_type if sign_type <= 8 else 8, coordinate[0][0], coordinate[0][1], coordinate[1][0], coordinate[1][1]]
-            cv2.rectangle(image, coordinate[0],coordinate[1], (0, 255, 0), 1)
-            font = cv2.FONT_HERSHEY_PLAIN
-            cv2.putText(image,text,(coordinate[0][0], coordinate[0][1] -15), font, 1,(0,0,255),2,cv2.LINE_4)
-
-            tl = [left, top]
-            br = [right,bottom]
-            #print(tl, br)
-            current_size = math.sqrt(math.pow((tl[0]-br[0]),2) + math.pow((tl[1]-br[1]),2))
-          
-            roi = frame[tl[1]:br[1], tl[0]:br[0]]
-            
-            roiHist = cv2.calcHist([roi], [0], None, [16], [0, 180])
-            roiHist = cv2.normalize(roiHist, roiHist, 0, 255, cv2.NORM_MINMAX)
-            roiBox = (tl[0], tl[1], br[0], br[1])
-
-        elif current_sign:
-            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-            backProj = cv2.calcBackProject([hsv], [0], roiHist, [0, 180], 1)
-
-            (r, roiBox) = cv2.CamShift(backProj, roiBox, termination)
-            pts = np.int0(cv2.boxPoints(r))
-            s = pts.sum(axis = 1)
-            tl = pts[np.argmin(s)]
-            br = pts[np.argmax(s)]
-            size = math.sqrt(pow((tl[0]-br[0]),2) +pow((tl[1]-br[1]),2))
-            #print(size)
-
-            if  current_size < 1 or size < 1 or size / current_size > 30 or math.fabs((tl[0]-br[0])/(tl[1]-br[1])) > 2 or math.fabs((tl[0]-br[0])/(tl[1]-br[1])) < 0.5:
-                current_sign = None
-                #print("Stop tracking")
+    try:
+        while True:
+            success,frame = vidcap.read()
+            if not success:
+                #print("FINISHED")
+                break
+            if frame_bus and raw_bus is None:
+                raw_bus = FrameBus(f"{frame_bus}_raw", frame.shape, mode=args.frame_bus_mode)
+                annotated_bus = FrameBus(f"{frame_bus}_annotated", (480, 720, 3), mode=args.frame_bus_mode)
+            if raw_bus is not None:
+                raw_bus.publish(frame)
+            combined_frame, image = process_frame(state, frame, model, args, speech_worker, display=args.display)
+            if annotated_bus is not None:
+                annotated_bus.publish(image, describe(state))
+            if args.display:
+                cv2.imshow('Result', combined_frame)
+            if recording:
+                out.write(image)    
             else:
-                current_size = size
-        
-            if sign_type > 0:
-                top = int(coordinate[0][1])
-                left = int(coordinate[0][0])
-                bottom = int(coordinate[1][1])
-                right = int(coordinate[1][0])
-
-                position = [count, sign_type if sign_type <= 8 else 8, left, top, right, bottom]
-                cv2.rectangle(image, coordinate[0],coordinate[1], (0, 255, 0), 1)
-                font = cv2.FONT_HERSHEY_PLAIN
-                cv2.putText(image,text,(coordinate[0][0], coordinate[0][1] -15), font, 1,(0,0,255),2,cv2.LINE_4)
-            elif current_sign:
-                position = [count, sign_type if sign_type <= 8 else 8, tl[0], tl[1], br[0], br[1]]
-                cv2.rectangle(image, (tl[0], tl[1]),(br[0], br[1]), (0, 255, 0), 1)
-                font = cv2.FONT_HERSHEY_PLAIN
-                cv2.putText(image,current_text,(tl[0], tl[1] -15), font, 1,(0,0,255),2,cv2.LINE_4)
-
-    
-        if current_sign:
-            sign_count += 1
-            coordinates.append(position)
-            last_detection_time = play_sound_for_sign(speech, current_text, cooldown_duration, last_detection_time)
-        combined_frame = cv2.addWeighted(frame_with_lane_detection, 0.5, image, 0.5, 0)
-        cv2.imshow('Result', combined_frame)
-        if subscription_status_ins == True:
-            out.write(image)    
-        else:
-            pass
-        count = count + 1
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    
-    if subscription_status_ins == True:
+                pass
+            if on_frame is not None and on_frame(state) is False:
+                break
+            if args.display and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        file.close()
+        vidcap.release()
+        speech_worker.stop()
+        if raw_bus is not None:
+            raw_bus.close()
+        if annotated_bus is not None:
+            annotated_bus.close()
+        if recording:
+            out.release()
+        if args.display:
+            cv2.destroyAllWindows()
+    if recording:
         print(f"File saved at D:\\Save\\record\\front_adas_{timestamp}.avi")
-    else:
+    elif subscription_status_ins != True:
         print("You have not subscribed to Insurance Companion")        
-    cv2.destroyAllWindows()
     return
 
 if __name__ == '__main__':
@@ -575,8 +705,9 @@ if __name__ == '__main__':
     #parser.add_argument('--file_name', default="D:\\Traffic-Sign-Detection-master\\teest.avi", help="Video to be analyzed")
     #parser.add_argument('--file_name', default="/teest.avi", help="Video to be analyzed")
     #parser.add_argument('--file_name', default="D:\\ADAS\\Back\\(21).mp4", help="Video to be analyzed")
-    parser.add_argument('--min_size_components', type=int, default=300, help="Min size component to be reserved")
-    parser.add_argument('--similitary_contour_with_circle', type=float, default=0.60, help="Similarity to a circle")
+    add_detection_arguments(parser)
+    parser.add_argument('--frame_bus', help="Publish captured and annotated frames to shared memory buses <name>_raw and <name>_annotated")
+    parser.add_argument('--frame_bus_mode', choices=["overwrite", "block"], default="overwrite", help="Let slow consumers skip frames, or wait for them")
     
     
 
@@ -0,0 +1,197 @@
+"Compressed approximations of the RBF sign classifier in data_svm.dat"
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Usage:
+# Prune to half of the support vectors: python compressed_svm.py --dataset .\dataset --mode prune --ratio 0.5
+# Random Fourier features, several settings: python compressed_svm.py --dataset .\dataset --mode rff --ratio 0.25 0.5 1.0
+#
+# The dataset folder holds one sub folder per class id (dataset\0, dataset\1, ...) with the sign crops.
+
+MODES = ["prune", "rff"]
+
+
+class CompressedSVM:
+    """One-vs-one RBF SVM evaluated with NumPy, optionally in random Fourier feature space.
+
+    predict() returns the same (retval, results) pair as cv2.ml.SVM.predict so the
+    object can be passed to getLabel in place of the OpenCV model.
+    """
+
+    def __init__(self, class_labels, rho, weights, support_vectors=None, gamma=None, projection=None, offset=None):
+        self.class_labels = class_labels
+        self.rho = rho
+        self.weights = weights
+        self.support_vectors = support_vectors
+        self.gamma = gamma
+        self.projection = projection
+        self.offset = offset
+        pairs = [(i, j) for i in range(len(class_labels)) for j in range(i + 1, len(class_labels))]
+        self.pair_first = np.array([i for i, _ in pairs])
+        self.pair_second = np.array([j for _, j in pairs])
+        self.class_index = np.arange(len(class_labels))
+        if support_vectors is not None:
+            self.sv_norms = np.sum(support_vectors ** 2, axis=1)
+
+    def features(self, samples):
+        if self.projection is not None:
+            scale = np.sqrt(2.0 / self.projection.shape[1])
+            return scale * np.cos(samples @ self.projection + self.offset)
+        d2 = np.sum(samples ** 2, axis=1)[:, None] + self.sv_norms[None, :] - 2.0 * (samples @ self.support_vectors.T)
+        return np.exp(-self.gamma * np.maximum(d2, 0.0))
+
+    def decision_function(self, samples):
+        samples = np.asarray(samples, dtype=np.float64).reshape(len(samples), -1)
+        return self.features(samples) @ self.weights - self.rho
+
+    def predict(self, samples):
+        values = self.decision_function(samples)
+        # Same pairing and tie breaking as OpenCV: class i beats class j when the value is positive.
+        winners = np.where(values > 0, self.pair_first, self.pair_second)
+        votes = np.sum(winners[:, :, None] == self.class_index, axis=1)
+        results = self.class_labels[np.argmax(votes, axis=1)]
+        return 0.0, results.astype(np.float32).reshape(-1, 1)
+
+    @property
+    def n_components(self):
+        return self.weights.shape[0]
+
+
+def read_svm(model, filename):
+    """Read the support vectors and one-vs-one decision functions of an RBF SVM."""
+    if model.getKernelType() != cv2.ml.SVM_RBF:
+        raise ValueError("Only RBF kernel models can be compressed")
+    fs = cv2.FileStorage(filename, cv2.FILE_STORAGE_READ)
+    class_labels = fs.getNode('opencv_ml_svm').getNode('class_labels').mat().ravel()
+    fs.release()
+
+    support_vectors = model.getSupportVectors().astype(np.float64)
+    n_functions = len(class_labels) * (len(class_labels) - 1) // 2
+    rho = np.zeros(n_functions)
+    alpha = np.zeros((len(support_vectors), n_functions))
+    for i in range(n_functions):
+        rho[i], df_alpha, df_index = model.getDecisionFunction(i)
+        alpha[df_index.ravel(), i] = df_alpha.ravel()
+    return class_labels, support_vectors, model.getGamma(), alpha, rho
+
+
+def rbf_kernel(a, b, gamma):
+    d2 = np.sum(a ** 2, axis=1)[:, None] + np.sum(b ** 2, axis=1)[None, :] - 2.0 * (a @ b.T)
+    return np.exp(-gamma * np.maximum(d2, 0.0))
+
+
+def prune_svm(model, filename, ratio, eps=1e-8):
+    """Reduced-set approximation on the ratio of support vectors with the largest total |alpha|.
+
+    The weights of the kept vectors are re-fitted so their expansion is the least squares
+    projection of the full one in kernel space: beta = (K_kk + eps I)^-1 K_k,all alpha.
+    """
+    class_labels, support_vectors, gamma, alpha, rho = read_svm(model, filename)
+    keep = max(1, int(round(ratio * len(support_vectors))))
+    order = np.argsort(-np.sum(np.abs(alpha), axis=1))[:keep]
+    kept = support_vectors[order]
+    if keep < len(support_vectors):
+        gram = rbf_kernel(kept, kept, gamma) + eps * np.eye(keep)
+        weights = np.linalg.solve(gram, rbf_kernel(kept, support_vectors, gamma) @ alpha)
+    else:
+        weights = alpha[order]
+    return CompressedSVM(class_labels, rho, weights, support_vectors=kept, gamma=gamma)
+
+
+def rff_svm(model, filename, ratio, seed=0):
+    """Fold the kernel expansion into a linear model over random Fourier features.
+
+    exp(-gamma * |x - y|^2) is approximated by z(x).z(y) with z(x) = sqrt(2/D) cos(Wx + b),
+    W ~ N(0, 2 * gamma) and b ~ U(0, 2 pi), so each decision function becomes z(x).w - rho.
+    """
+    class_labels, support_vectors, gamma, alpha, rho = read_svm(model, filename)
+    n_features = max(1, int(round(ratio * len(support_vectors))))
+    rng = np.random.default_rng(seed)
+    projection = rng.normal(0.0, np.sqrt(2.0 * gamma), size=(support_vectors.shape[1], n_features))
+    offset = rng.uniform(0.0, 2.0 * np.pi, size=n_features)
+    compressed = CompressedSVM(class_labels, rho, None, projection=projection, offset=offset)
+    compressed.weights = compressed.features(support_vectors).T @ alpha
+    return compressed
+
+
+def load_compressed_model(model, filename, mode, ratio):
+    if mode == "prune":
+        return prune_svm(model, filename, ratio)
+    if mode == "rff":
+        return rff_svm(model, filename, ratio)
+    raise ValueError(f"Unknown compression mode: {mode}")
+
+
+def load_dataset(folder):
+    """Load sign crops from one sub folder per class id."""
+    images = []
+    labels = []
+    for name in sorted(os.listdir(folder)):
+        class_folder = os.path.join(folder, name)
+        if not name.isdigit() or not os.path.isdir(class_folder):
+            continue
+        for image_name in sorted(os.listdir(class_folder)):
+            image = cv2.imread(os.path.join(class_folder, image_name))
+            if image is None:
+                continue
+            images.append(image)
+            labels.append(int(name))
+    return images, np.array(labels)
+
+
+def time_predictions(model, descriptors):
+    """Classify one sample at a time, the way getLabel does, and return (labels, seconds)."""
+    predictions = []
+    start = time.perf_counter()
+    for descriptor in descriptors:
+        predictions.append(int(model.predict(descriptor.reshape(1, -1))[1][0][0]))
+    return np.array(predictions), time.perf_counter() - start
+
+
+def evaluate(model, filename, descriptors, labels, mode, ratios):
+    full, full_time = time_predictions(model, descriptors)
+    results = []
+    for ratio in ratios:
+        compressed = load_compressed_model(model, filename, mode, ratio)
+        predictions, compressed_time = time_predictions(compressed, descriptors)
+        results.append({
+            'ratio': ratio,
+            'components': compressed.n_components,
+            'agreement': float(np.mean(predictions == full)),
+            'accuracy': float(np.mean(predictions == labels)),
+            'speedup': full_time / compressed_time if compressed_time > 0 else float('inf'),
+        })
+    return float(np.mean(full == labels)), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate compressed sign classifiers against the full SVM")
+    parser.add_argument('--model', default="data_svm.dat", help="Full SVM model file")
+    parser.add_argument('--dataset', required=True, help="Folder with one sub folder of sign crops per class id")
+    parser.add_argument('--mode', choices=MODES, default="prune", help="Compression method")
+    parser.add_argument('--ratio', type=float, nargs='+', default=[0.25, 0.5, 0.75], help="Components kept, as a fraction of the support vectors")
+    args = parser.parse_args()
+
+    from Sub_RSR import compute_hog
+
+    model = cv2.ml.SVM_load(args.model)
+    images, labels = load_dataset(args.dataset)
+    if not images:
+        print(f"No images found in {args.dataset}")
+        return
+    descriptors = np.vstack([compute_hog(image) for image in images])
+
+    full_accuracy, results = evaluate(model, args.model, descriptors, labels, args.mode, args.ratio)
+    print(f"Samples: {len(labels)}  full model accuracy: {full_accuracy:.3f}")
+    print(f"{'ratio':>6} {'components':>10} {'agreement':>9} {'accuracy':>8} {'speedup':>7}")
+    for r in results:
+        print(f"{r['ratio']:>6.2f} {r['components']:>10} {r['agreement']:>9.3f} {r['accuracy']:>8.3f} {r['speedup']:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
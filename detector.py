@@ -0,0 +1,77 @@
+"Embeddable road sign and lane detector"
+
+import argparse
+import asyncio
+
+from Sub_RSR import SilentSpeech, StreamState, add_detection_arguments, describe, load_sign_model, process_frame
+
+# detector = Detector()
+# for frame in frames:
+#     result = detector.process(frame)
+#
+# Importing has no side effects and does not read the subscription files. Until
+# Sub_RSR.load_subscriptions() is called the speed assist subscription counts as inactive,
+# and process_frame reports sign types 1-7, speed limits included. With an active speed
+# assist subscription process_frame reports no signs at all.
+#
+# Several streams on one model:
+# model = load_sign_model(default_args())
+# front, rear = Detector(model, state=StreamState("front")), Detector(model, state=StreamState("rear"))
+#
+# In async code:
+# async for result in detector.stream(cv2.VideoCapture("drive.avi")):
+#     ...
+
+
+def default_args(**overrides):
+    """The same settings Sub_RSR.py uses when run without arguments, without preview windows."""
+    parser = argparse.ArgumentParser()
+    add_detection_arguments(parser)
+    args = parser.parse_args([])
+    args.display = False
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    return args
+
+
+class Detector:
+    """Lane and sign detection on one stream.
+
+    All per-stream memory (lane window, tracks, frame count, static scene gate) lives in
+    `state`, so any number of detectors can share one loaded model.
+    """
+
+    def __init__(self, model=None, args=None, state=None, speech_worker=None):
+        self.args = args if args is not None else default_args()
+        self.model = model if model is not None else load_sign_model(self.args)
+        self.state = state if state is not None else StreamState()
+        self.speech_worker = speech_worker if speech_worker is not None else SilentSpeech()
+
+    def process(self, frame):
+        """Process one BGR frame. Returns describe(state) plus the 'overlay' and annotated 'image' frames."""
+        combined_frame, image = process_frame(self.state, frame, self.model, self.args, self.speech_worker, display=self.args.display)
+        result = describe(self.state)
+        result['overlay'] = combined_frame
+        result['image'] = image
+        return result
+
+    async def stream(self, source):
+        """Async iterator of results over a frame source.
+
+        The source can be an async iterable of frames, an iterable of frames, or anything with a
+        VideoCapture style read(). Frames are processed in the default executor so the event
+        loop stays responsive.
+        """
+        loop = asyncio.get_running_loop()
+        if hasattr(source, '__aiter__'):
+            async for frame in source:
+                yield await loop.run_in_executor(None, self.process, frame)
+        elif hasattr(source, 'read'):
+            while True:
+                success, frame = await loop.run_in_executor(None, source.read)
+                if not success:
+                    break
+                yield await loop.run_in_executor(None, self.process, frame)
+        else:
+            for frame in source:
+                yield await loop.run_in_executor(None, self.process, frame)
@@ -0,0 +1,243 @@
+"Local detection server: one loaded model serving frames from several client processes"
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+from detector import Detector
+from Sub_RSR import StreamState, add_detection_arguments, describe, load_sign_model, load_subscriptions
+
+# Start the server:   python detector_server.py --socket /tmp/rsr.sock
+# From any process:   client = DetectorClient("/tmp/rsr.sock", "front")
+#                     result = client.process(frame)
+#
+# The address is a Unix socket path, or host:port for TCP. Windows has no Unix sockets in
+# socketserver, so there the default is TCP on the loopback interface.
+#
+# Messages on the socket are a 4 byte big-endian length followed by that many bytes.
+# A request is a JSON header message ({"shape": [h, w, 3], "stream": name}) and a message with the raw
+# uint8 BGR pixels. The reply is one JSON message, the same dict as Detector.process without the images,
+# or {"error": reason} when the request is malformed.
+
+
+DEFAULT_ADDRESS = "/tmp/rsr.sock" if hasattr(socket, 'AF_UNIX') else "127.0.0.1:50917"
+
+
+def parse_address(address):
+    """(family, address) for a Unix socket path or a host:port string."""
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ValueError(f"Unix sockets are not available on this platform, give host:port instead of {address}")
+    return socket.AF_UNIX, address
+
+
+def remove_stale_socket(path):
+    """Remove a Unix socket file left by a server that is gone. Raises OSError if one still listens on it."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+    else:
+        raise OSError(f"A detection server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def send_message(sock, payload):
+    sock.sendall(struct.pack('!I', len(payload)) + payload)
+
+
+def recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_message(sock):
+    (size,) = struct.unpack('!I', recv_exact(sock, 4))
+    return recv_exact(sock, size)
+
+
+class MicroBatcher:
+    """Drop-in model whose predict() merges concurrent calls into one call on the real model.
+
+    The first waiting request opens a batch, which closes after max_wait seconds or once it
+    holds max_batch samples. Every caller gets back only its own rows.
+    """
+
+    def __init__(self, model, max_batch=64, max_wait=0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.samples = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def predict(self, samples):
+        request = {'samples': samples, 'done': threading.Event()}
+        self.requests.put(request)
+        request['done'].wait()
+        if 'error' in request:
+            raise request['error']
+        return 0.0, request['results']
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            rows = len(batch[0]['samples'])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                rows += len(request['samples'])
+            self.predict_batch(batch)
+
+    def predict_batch(self, batch):
+        try:
+            results = self.model.predict(np.vstack([request['samples'] for request in batch]))[1]
+            start = 0
+            for request in batch:
+                end = start + len(request['samples'])
+                request['results'] = results[start:end]
+                start = end
+        except Exception as error:
+            for request in batch:
+                request['error'] = error
+        self.batches += 1
+        self.samples += sum(len(request['samples']) for request in batch)
+        for request in batch:
+            request['done'].set()
+
+
+def decode_frame(header, pixels):
+    """Check a request and return its header and frame. Raises ValueError with the reason it was rejected."""
+    try:
+        header = json.loads(header)
+    except ValueError:
+        raise ValueError("Header is not valid JSON")
+    if not isinstance(header, dict):
+        raise ValueError("Header must be a JSON object")
+    shape = header.get('shape')
+    if not isinstance(shape, list) or len(shape) != 3 or shape[2] != 3 or not all(type(value) is int and value > 0 for value in shape):
+        raise ValueError(f"shape must be [height, width, 3], got {shape}")
+    if not isinstance(header.get('stream', ''), str):
+        raise ValueError("stream must be a string")
+    if len(pixels) != shape[0] * shape[1] * shape[2]:
+        raise ValueError(f"Expected {shape[0] * shape[1] * shape[2]} bytes of pixels for shape {shape}, got {len(pixels)}")
+    return header, np.frombuffer(pixels, dtype=np.uint8).reshape(shape)
+
+
+class DetectionHandler(socketserver.BaseRequestHandler):
+    """One client connection: frames in, detections out, with its own stream state."""
+
+    def handle(self):
+        detector = None
+        while True:
+            try:
+                header = recv_message(self.request)
+                pixels = recv_message(self.request)
+            except ConnectionError:
+                break
+            try:
+                header, frame = decode_frame(header, pixels)
+            except ValueError as error:
+                send_message(self.request, json.dumps({'error': str(error)}).encode())
+                continue
+            if detector is None:
+                state = StreamState(header.get('stream', 'client'))
+                detector = Detector(self.server.batcher, self.server.args, state)
+            detector.process(frame)
+            send_message(self.request, json.dumps(describe(detector.state)).encode())
+
+
+class DetectionServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Serves on a Unix socket path or a host:port address, see parse_address."""
+
+    daemon_threads = True
+
+    def __init__(self, address, model, args, max_batch, max_wait):
+        self.address_family, server_address = parse_address(address)
+        if self.address_family == socket.AF_UNIX:
+            remove_stale_socket(server_address)
+        self.args = args
+        self.batcher = MicroBatcher(model, max_batch, max_wait)
+        super().__init__(server_address, DetectionHandler)
+
+    def server_close(self):
+        super().server_close()
+        if self.address_family == socket.AF_UNIX and os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class DetectorClient:
+    """Send frames to a running detection server and get the detections back."""
+
+    def __init__(self, address=DEFAULT_ADDRESS, stream="client"):
+        family, address = parse_address(address)
+        self.stream = stream
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+
+    def process(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        send_message(self.sock, json.dumps({'shape': frame.shape, 'stream': self.stream}).encode())
+        send_message(self.sock, frame.tobytes())
+        reply = json.loads(recv_message(self.sock))
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return reply
+
+    def close(self):
+        self.sock.close()
+
+
+def main(args):
+    load_subscriptions()
+    model = load_sign_model(args)
+    args.display = False
+    server = DetectionServer(args.socket, model, args, args.max_batch, args.max_wait_ms / 1000)
+    print(f"Serving on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.batcher.batches:
+            print(f"{server.batcher.samples} sign crops in {server.batcher.batches} batches")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve road sign and lane detection to local processes over a local socket")
+    parser.add_argument('--socket', default=DEFAULT_ADDRESS, help="Unix socket path, or host:port to serve over TCP")
+    parser.add_argument('--max_batch', type=int, default=64, help="Most sign crops classified in one call")
+    parser.add_argument('--max_wait_ms', type=float, default=5, help="How long a batch waits for crops from other streams")
+    add_detection_arguments(parser)
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,231 @@
+"Shared memory ring of frames for consumers running in other processes"
+
+import json
+import os
+import time
+
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+# Layout of the shared block:
+#   header     int64[HEADER]: slots, height, width, channels, meta_size, max_consumers, mode, write_seq, closed
+#   slot_seq   int64[slots]: sequence number held by each slot, -1 while it is being written
+#   cursors    int64[max_consumers]: last sequence number each consumer is done with, -1 when unused
+#   owners     int64[max_consumers]: random token of the reader holding each cursor
+#   slots      slots * (meta_size + height * width * channels) bytes: JSON metadata then pixels
+#
+# Sequence numbers start at 1 and frame n lives in slot n % slots.
+
+HEADER = 9
+SLOTS, HEIGHT, WIDTH, CHANNELS, META_SIZE, MAX_CONSUMERS, MODE, WRITE_SEQ, CLOSED = range(HEADER)
+OVERWRITE = 0
+BLOCK = 1
+MODES = {"overwrite": OVERWRITE, "block": BLOCK}
+
+
+def attach_shared_memory(name):
+    """Attach without letting this process's resource tracker unlink the block when it exits."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 attaching always registers the block, skip that registration.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class RingLayout:
+    """NumPy views of the header, slot sequence numbers, consumer cursors and slots of a bus."""
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        slots, height, width, channels, meta_size, max_consumers = (int(value) for value in self.header[:MODE])
+        self.shape = (height, width, channels) if channels > 1 else (height, width)
+        self.meta_size = meta_size
+        offset = HEADER * 8
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += slots * 8
+        self.cursors = np.ndarray((max_consumers,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += max_consumers * 8
+        self.owners = np.ndarray((max_consumers,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += max_consumers * 8
+        frame_size = height * width * channels
+        self.meta = []
+        self.frames = []
+        for slot in range(slots):
+            self.meta.append(np.ndarray((meta_size,), dtype=np.uint8, buffer=shm.buf, offset=offset))
+            self.frames.append(np.ndarray(self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset + meta_size))
+            offset += meta_size + frame_size
+
+    @staticmethod
+    def size(slots, shape, meta_size, max_consumers):
+        frame_size = int(np.prod(shape))
+        return (HEADER + slots + 2 * max_consumers) * 8 + slots * (meta_size + frame_size)
+
+    def release(self):
+        # Views must go before the block can be closed.
+        self.header = self.slot_seq = self.cursors = self.owners = None
+        self.meta = self.frames = []
+
+
+class FrameBus:
+    """Producer side. publish() copies a frame into the next slot.
+
+    In overwrite mode the producer never waits and slow consumers skip frames. In block mode
+    publish() waits, up to block_timeout seconds, for every attached consumer to be done with
+    the frame it is about to overwrite. Consumers still behind after that are evicted, so a
+    dead reader stalls the producer only once; a live one claims a free cursor again on its
+    next read().
+    """
+
+    def __init__(self, name, shape, slots=8, meta_size=4096, max_consumers=8, mode="overwrite", block_timeout=1.0):
+        channels = shape[2] if len(shape) > 2 else 1
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=RingLayout.size(slots, shape, meta_size, max_consumers))
+        header = np.ndarray((HEADER,), dtype=np.int64, buffer=self.shm.buf)
+        header[:] = [slots, shape[0], shape[1], channels, meta_size, max_consumers, MODES[mode], 0, 0]
+        del header
+        self.ring = RingLayout(self.shm)
+        self.ring.slot_seq[:] = 0
+        self.ring.cursors[:] = -1
+        self.ring.owners[:] = 0
+        self.name = name
+        self.block_timeout = block_timeout
+        self.dropped_waits = 0
+        self.evicted = 0
+
+    def publish(self, frame, meta=None):
+        """Write a frame and its JSON serializable metadata. Returns the frame's sequence number."""
+        ring = self.ring
+        slots = len(ring.slot_seq)
+        seq = int(ring.header[WRITE_SEQ]) + 1
+        if ring.header[MODE] == BLOCK:
+            self.wait_for_consumers(seq - slots)
+        slot = seq % slots
+        ring.slot_seq[slot] = -1
+        np.copyto(ring.frames[slot], frame.reshape(ring.shape), casting='unsafe')
+        payload = json.dumps(meta).encode() if meta is not None else b""
+        if len(payload) > ring.meta_size - 4:
+            raise ValueError(f"Metadata is {len(payload)} bytes, the bus holds {ring.meta_size - 4}")
+        ring.meta[slot][:4] = np.frombuffer(np.uint32(len(payload)).tobytes(), dtype=np.uint8)
+        ring.meta[slot][4:4 + len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+        ring.slot_seq[slot] = seq
+        ring.header[WRITE_SEQ] = seq
+        return seq
+
+    def wait_for_consumers(self, overwritten_seq):
+        if overwritten_seq < 1:
+            return
+        deadline = time.perf_counter() + self.block_timeout
+        while True:
+            attached = self.ring.cursors[self.ring.cursors >= 0]
+            if len(attached) == 0 or attached.min() >= overwritten_seq:
+                return
+            if time.perf_counter() > deadline:
+                stuck = (self.ring.cursors >= 0) & (self.ring.cursors < overwritten_seq)
+                self.ring.cursors[stuck] = -1
+                self.dropped_waits += 1
+                self.evicted += int(np.count_nonzero(stuck))
+                return
+            time.sleep(0.0005)
+
+    def close(self):
+        """Tell consumers no more frames are coming, then free the block."""
+        self.ring.header[CLOSED] = 1
+        self.ring.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FrameReader:
+    """Consumer side. read() returns (seq, frame, meta) where frame is a view into shared memory.
+
+    The view stays valid until the next read() in block mode, unless the reader took longer
+    than the bus's block_timeout and was evicted. In overwrite mode the producer may reuse the
+    slot at any time, so check is_current(seq) after using the frame, or copy it.
+
+    Cursors are claimed without a lock. Each reader marks its cursor with a random token and
+    checks it on every read(): when the producer has evicted it, or another reader starting
+    at the same moment took the same cursor, it claims a free one again.
+    """
+
+    def __init__(self, name, poll_interval=0.001):
+        self.shm = attach_shared_memory(name)
+        self.ring = RingLayout(self.shm)
+        self.poll_interval = poll_interval
+        self.skipped = 0
+        self.evictions = 0
+        self.name = name
+        self.token = int.from_bytes(os.urandom(7), 'big') + 1
+        self.consumer = None
+        # Start from the newest frame.
+        self.next_seq = max(int(self.ring.header[WRITE_SEQ]), 1)
+        self.attach()
+
+    def attach(self):
+        """Claim a free cursor, marked as done with the frames before next_seq."""
+        free = np.flatnonzero(self.ring.cursors < 0)
+        if len(free) == 0:
+            raise RuntimeError(f"Frame bus {self.name} has no free consumer slot")
+        self.consumer = int(free[0])
+        self.ring.owners[self.consumer] = self.token
+        self.ring.cursors[self.consumer] = self.next_seq - 1
+
+    def attached(self):
+        """False once the producer evicted this reader or another reader took its cursor."""
+        return self.ring.cursors[self.consumer] >= 0 and self.ring.owners[self.consumer] == self.token
+
+    def read(self, timeout=None):
+        """Wait for the next frame. Returns None on timeout or once the producer has closed the bus."""
+        ring = self.ring
+        slots = len(ring.slot_seq)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            write_seq = int(ring.header[WRITE_SEQ])
+            if write_seq - self.next_seq >= slots:
+                # Lapped by the producer: jump to the oldest frame still in the ring.
+                self.skipped += write_seq - slots + 1 - self.next_seq
+                self.next_seq = write_seq - slots + 1
+            if not self.attached():
+                self.evictions += 1
+                self.attach()
+            if write_seq >= self.next_seq:
+                seq = self.next_seq
+                slot = seq % slots
+                ring.cursors[self.consumer] = seq - 1
+                meta = self.read_meta(slot)
+                self.next_seq = seq + 1
+                if ring.slot_seq[slot] == seq:
+                    return seq, ring.frames[slot], meta
+                # Overwritten while we were reading it.
+                self.skipped += 1
+                continue
+            if ring.header[CLOSED]:
+                return None
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def read_meta(self, slot):
+        meta = self.ring.meta[slot]
+        size = int(np.frombuffer(meta[:4].tobytes(), dtype=np.uint32)[0])
+        if size == 0 or size > len(meta) - 4:
+            return None
+        try:
+            return json.loads(meta[4:4 + size].tobytes())
+        except ValueError:
+            return None
+
+    def is_current(self, seq):
+        """True while the slot of frame seq has not been overwritten."""
+        return self.ring.slot_seq[seq % len(self.ring.slot_seq)] == seq
+
+    def close(self):
+        if self.ring.cursors is not None and self.consumer is not None and self.attached():
+            self.ring.cursors[self.consumer] = -1
+        self.ring.release()
+        self.shm.close()
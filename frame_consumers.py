@@ -0,0 +1,102 @@
+"Consumers that attach to the frame buses published by Sub_RSR.py --frame_bus"
+
+import argparse
+import time
+
+import cv2
+
+from frame_bus import FrameReader
+
+# Sub_RSR.py --frame_bus front publishes two buses: front_raw (captured frames) and
+# front_annotated (recorded frames, with the detections of that frame as metadata).
+#
+# python frame_consumers.py writer --bus front_annotated --output front.avi
+# python frame_consumers.py preview --bus front_raw
+# python frame_consumers.py logger --bus front_annotated --output detections.txt
+# python frame_consumers.py telemetry --bus front_annotated --interval 10
+
+
+def frames(reader, timeout):
+    """Yield (seq, frame, meta) until the producer closes the bus or goes quiet for timeout seconds."""
+    while True:
+        item = reader.read(timeout)
+        if item is None:
+            return
+        yield item
+
+
+def run_writer(reader, args):
+    height, width = reader.ring.shape[:2]
+    out = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*'XVID'), args.fps, (width, height))
+    torn = 0
+    for seq, frame, meta in frames(reader, args.timeout):
+        out.write(frame)
+        if not reader.is_current(seq):
+            torn += 1
+    out.release()
+    print(f"Saved {args.output}, {reader.skipped} frames skipped, {torn} overwritten while encoding")
+
+
+def run_preview(reader, args):
+    for seq, frame, meta in frames(reader, args.timeout):
+        cv2.imshow(f"Preview {args.bus}", frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+    cv2.destroyAllWindows()
+
+
+def run_logger(reader, args):
+    with open(args.output, "w") as file:
+        for seq, frame, meta in frames(reader, args.timeout):
+            if meta is None:
+                continue
+            for track in meta['tracks']:
+                file.write(" ".join(str(value) for value in [meta['frame'], track['sign_type']] + track['box']) + "\n")
+            if meta['lane_warning']:
+                file.write(f"{meta['frame']} lane_departure\n")
+
+
+def upload_telemetry(summary):
+    """Stub for the telemetry uploader, prints what would be sent."""
+    print(f"telemetry: {summary}")
+
+
+def run_telemetry(reader, args):
+    summary = {'frames': 0, 'signs': {}, 'lane_warnings': 0, 'skipped': 0}
+    next_upload = time.time() + args.interval
+    for seq, frame, meta in frames(reader, args.timeout):
+        summary['frames'] += 1
+        if meta is not None:
+            for track in meta['tracks']:
+                summary['signs'][track['text']] = summary['signs'].get(track['text'], 0) + 1
+            summary['lane_warnings'] += meta['lane_warning']
+        if time.time() >= next_upload:
+            summary['skipped'] = reader.skipped
+            upload_telemetry(summary)
+            summary = {'frames': 0, 'signs': {}, 'lane_warnings': 0, 'skipped': 0}
+            next_upload = time.time() + args.interval
+
+
+CONSUMERS = {
+    'writer': run_writer,
+    'preview': run_preview,
+    'logger': run_logger,
+    'telemetry': run_telemetry,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Read frames from a shared memory frame bus in a separate process")
+    parser.add_argument('consumer', choices=sorted(CONSUMERS), help="What to do with the frames")
+    parser.add_argument('--bus', required=True, help="Bus name, e.g. front_raw or front_annotated")
+    parser.add_argument('--output', default="bus_output.avi", help="Output file of the writer and logger")
+    parser.add_argument('--fps', type=float, default=20, help="Frame rate of the written video")
+    parser.add_argument('--interval', type=float, default=10, help="Seconds between telemetry uploads")
+    parser.add_argument('--timeout', type=float, default=30, help="Stop after this many seconds without frames")
+
+    args = parser.parse_args()
+    reader = FrameReader(args.bus)
+    try:
+        CONSUMERS[args.consumer](reader, args)
+    finally:
+        reader.close()
@@ -0,0 +1,118 @@
+"Road sign and lane detection on several cameras with one model and one speech worker"
+
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import cv2
+
+from Sub_RSR import (StreamState, add_detection_arguments, get_speech_worker, load_sign_model, load_subscriptions,
+                     process_frame)
+
+# Front and rear camera: python multi_camera.py --sources 0 1 --names front rear
+# Two recorded drives: python multi_camera.py --sources front.avi rear.avi --names front rear
+
+
+class Stream:
+    """One camera or video file with its own detection state, recording and detection log."""
+
+    def __init__(self, source, name, timestamp, speech_worker, record=False):
+        self.name = name
+        self.vidcap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+        if not self.vidcap.isOpened():
+            raise IOError(f"Cannot open {source}")
+        self.state = StreamState(name)
+        self.speech_worker = speech_worker
+        self.out = None
+        if record:
+            fps = self.vidcap.get(cv2.CAP_PROP_FPS)
+            fourcc = cv2.VideoWriter_fourcc(*'XVID')
+            self.out = cv2.VideoWriter(os.path.join(".", f"{name}_adas_{timestamp}.avi"), fourcc, fps, (720,480))
+            print(f"Save started: {name}")
+        self.log = open(f"Output_{name}.txt", "w")
+
+    def step(self, model, args):
+        """Read and process the next frame. Returns the on screen overlay, or None at the end of the stream."""
+        success, frame = self.vidcap.read()
+        if not success:
+            return None
+        combined_frame, image = process_frame(self.state, frame, model, args, self.speech_worker, display=False)
+        for position in self.state.frame_positions:
+            self.log.write(" ".join(str(int(value)) for value in position) + "\n")
+        if self.out is not None:
+            self.out.write(image)
+        return combined_frame
+
+    def close(self):
+        self.vidcap.release()
+        if self.out is not None:
+            self.out.release()
+        self.log.close()
+
+
+def run(streams, model, args):
+    """Schedule frames from all streams on a shared pool.
+
+    Each stream has at most one frame in flight and is resubmitted as soon as its frame is
+    done, so the pool's FIFO queue interleaves the streams and a slow stream cannot starve
+    the others. Windows are only touched from this thread.
+    """
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        pending = {pool.submit(stream.step, model, args): stream for stream in streams}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stream = pending.pop(future)
+                combined_frame = future.result()
+                if combined_frame is None:
+                    continue
+                if args.display:
+                    cv2.imshow(f"Result {stream.name}", combined_frame)
+                pending[pool.submit(stream.step, model, args)] = stream
+            if args.display and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+        for future in pending:
+            future.cancel()
+        wait(pending)
+
+
+def main(args):
+    if args.names and len(args.names) != len(args.sources):
+        print("Error: --names must give one name per source.")
+        return
+    names = args.names or [f"camera{i}" for i in range(len(args.sources))]
+
+    subscription_status, subscription_status_ins = load_subscriptions()
+    speech_worker = get_speech_worker()
+    model = load_sign_model(args)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    streams = []
+    for source, name in zip(args.sources, names):
+        try:
+            streams.append(Stream(source, name, timestamp, speech_worker, subscription_status_ins == True and args.record))
+        except IOError as error:
+            print(f"{name}: {error}, skipped")
+    if not streams:
+        print("Error: none of the sources could be opened.")
+        return
+    try:
+        run(streams, model, args)
+    finally:
+        for stream in streams:
+            stream.close()
+            print(f"{stream.name}: {stream.state.count} frames, {stream.state.sign_count} sign detections")
+        speech_worker.stop()
+        if args.display:
+            cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Traffic Sign Detection with Lane Departure Warning System on several cameras")
+    parser.add_argument('--sources', nargs='+', default=["0"], help="Camera indices or video files")
+    parser.add_argument('--names', nargs='+', help="Name of each stream, used for windows, recordings and logs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker threads shared by all streams")
+    add_detection_arguments(parser)
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,264 @@
+"Parameter sweep of the sign and lane detectors on labelled clips, reusing shared stage outputs"
+
+import argparse
+import itertools
+import json
+import os
+import time
+from collections import defaultdict, deque
+from multiprocessing import Pool
+
+import cv2
+
+from compressed_svm import MODES
+from sign_tracker import iou
+from Sub_RSR import (findAllSigns, findContour, getLabel, lane_departure, lane_distance_ratio_of, lane_edges,
+                     lane_gray, lane_lines, load_sign_model, preprocess_image, remove_other_color,
+                     removeSmallComponents)
+
+# Sweep the contour thresholds and the lane warning threshold on two clips:
+# python parameter_sweep.py --clips drive1.avi drive2.avi --min_size_components 200 300 400 --similitary_contour_with_circle 0.5 0.6 0.7 --warning_threshold 0.1 0.2 0.3 0.4
+#
+# Every clip has a label file next to it with the same name and a .json extension:
+# {
+#     "signs": [[frame, sign_type, left, top, right, bottom], ...],
+#     "lane_departure": [frame, ...]
+# }
+# A sign counts as found when a detection of the same type overlaps it with IoU >= --iou.
+
+SIGN_PARAMETERS = ['min_size_components', 'similitary_contour_with_circle']
+LANE_PARAMETERS = ['canny_low', 'canny_high', 'hough_threshold', 'min_line_length', 'max_line_gap', 'warning_threshold']
+
+# Frames decoded before each segment's first frame to get past an imprecise seek.
+SEEK_MARGIN = 30
+
+model = None
+
+
+def init_worker(args):
+    global model
+    model = load_sign_model(args)
+
+
+def grid(args, names):
+    values = [getattr(args, name) for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def load_labels(clip):
+    with open(os.path.splitext(clip)[0] + '.json') as file:
+        labels = json.load(file)
+    signs = defaultdict(list)
+    for frame, sign_type, left, top, right, bottom in labels.get('signs', []):
+        signs[frame].append((sign_type, (left, top, right, bottom)))
+    return signs, set(labels.get('lane_departure', []))
+
+
+def seek(vidcap, index):
+    """Position vidcap so the next read() returns frame index. Returns False when the clip is shorter.
+
+    CAP_PROP_POS_FRAMES seeks land on a nearby keyframe with some codecs, so seek a little before
+    the frame, read back where the capture ended up and decode forward from there.
+    """
+    vidcap.set(cv2.CAP_PROP_POS_FRAMES, max(index - SEEK_MARGIN, 0))
+    position = int(vidcap.get(cv2.CAP_PROP_POS_FRAMES))
+    if position > index:
+        vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        position = int(vidcap.get(cv2.CAP_PROP_POS_FRAMES))
+    while position < index:
+        if not vidcap.grab():
+            return False
+        position += 1
+    if int(vidcap.get(cv2.CAP_PROP_POS_FRAMES)) != index:
+        raise RuntimeError(f"Cannot seek to frame {index} exactly, run with --segment_frames 0")
+    return True
+
+
+class StageCache:
+    """Outputs of the stages for the current frame, keyed by the parameters each stage depends on.
+
+    The time spent computing each entry is kept so the cost of a full run with one setting
+    can be reported even though the stage only ran once for all settings that share it.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.times = {}
+
+    def get(self, key, compute):
+        if key not in self.values:
+            start = time.perf_counter()
+            self.values[key] = compute()
+            self.times[key] = time.perf_counter() - start
+        return self.values[key]
+
+
+def sign_detections(cache, frame, setting):
+    min_size = setting['min_size_components']
+    similarity = setting['similitary_contour_with_circle']
+    binary_image = cache.get(('preprocess',), lambda: preprocess_image(frame))
+    color_mask = cache.get(('color',), lambda: remove_other_color(frame))
+
+    def contours():
+        filtered = removeSmallComponents(binary_image, min_size)
+        return findContour(cv2.bitwise_and(filtered, filtered, mask=color_mask))
+
+    contours = cache.get(('contours', min_size), contours)
+    signs = cache.get(('signs', min_size, similarity), lambda: findAllSigns(frame, contours, similarity, 15))
+
+    keys = [('preprocess',), ('color',), ('contours', min_size), ('signs', min_size, similarity)]
+    detections = []
+    for sign, coordinate in signs:
+        (left, top), (right, bottom) = coordinate
+        box = (int(left), int(top), int(right), int(bottom))
+        # Different settings often find the same contour, classify each crop once.
+        sign_type = cache.get(('label',) + box, lambda: min(getLabel(model, sign), 8))
+        keys.append(('label',) + box)
+        if sign_type > 0:
+            detections.append((sign_type, box))
+    return detections, keys
+
+
+def lane_ratio(cache, frame, setting):
+    canny = (setting['canny_low'], setting['canny_high'])
+    hough = (setting['hough_threshold'], setting['min_line_length'], setting['max_line_gap'])
+    gray = cache.get(('gray',), lambda: lane_gray(frame))
+    edges = cache.get(('edges',) + canny, lambda: lane_edges(gray, *canny))
+    ratio = cache.get(('ratio',) + canny + hough, lambda: lane_distance_ratio_of(lane_lines(edges, *hough)))
+    return ratio, [('gray',), ('edges',) + canny, ('ratio',) + canny + hough]
+
+
+def match(detections, truths, iou_threshold):
+    """Count true positives, false positives and false negatives for one frame."""
+    unmatched = list(truths)
+    tp = 0
+    for sign_type, box in detections:
+        for truth in unmatched:
+            if truth[0] == sign_type and iou(box, truth[1]) >= iou_threshold:
+                unmatched.remove(truth)
+                tp += 1
+                break
+    return tp, len(detections) - tp, len(unmatched)
+
+
+def evaluate_segment(job):
+    """Run every setting on frames [start, end) of one clip. Returns counts and costs per setting."""
+    clip, start, end, sign_settings, lane_settings, iou_threshold = job
+    sign_truth, lane_truth = load_labels(clip)
+    sign_results = [{'tp': 0, 'fp': 0, 'fn': 0, 'cost': 0.0} for _ in sign_settings]
+    lane_results = [{'tp': 0, 'fp': 0, 'fn': 0, 'cost': 0.0} for _ in lane_settings]
+    windows = [deque(maxlen=8) for _ in lane_settings]
+    frames = 0
+
+    vidcap = cv2.VideoCapture(clip)
+    # The lane warning looks at the last 8 frames, so fill the windows before the segment.
+    first = max(start - 7, 0)
+    if not seek(vidcap, first):
+        vidcap.release()
+        return 0, sign_results, lane_results
+    for index in range(first, end):
+        success, frame = vidcap.read()
+        if not success:
+            break
+        frame = cv2.resize(frame, (720,480))
+        cache = StageCache()
+        counted = index >= start
+        frames += counted
+
+        for setting, window, result in zip(lane_settings, windows, lane_results):
+            ratio, keys = lane_ratio(cache, frame, setting)
+            warning = lane_departure(window, ratio, setting['warning_threshold'])
+            if counted:
+                expected = index in lane_truth
+                result['tp'] += warning and expected
+                result['fp'] += warning and not expected
+                result['fn'] += expected and not warning
+                result['cost'] += sum(cache.times[key] for key in keys)
+
+        if not counted:
+            continue
+        for setting, result in zip(sign_settings, sign_results):
+            detections, keys = sign_detections(cache, frame, setting)
+            tp, fp, fn = match(detections, sign_truth.get(index, []), iou_threshold)
+            result['tp'] += tp
+            result['fp'] += fp
+            result['fn'] += fn
+            result['cost'] += sum(cache.times[key] for key in keys)
+    vidcap.release()
+    return frames, sign_results, lane_results
+
+
+def jobs(args, sign_settings, lane_settings):
+    for clip in args.clips:
+        vidcap = cv2.VideoCapture(clip)
+        length = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+        vidcap.release()
+        step = args.segment_frames if args.segment_frames > 0 else max(length, 1)
+        for start in range(0, max(length, 1), step):
+            yield clip, start, start + step, sign_settings, lane_settings, args.iou
+
+
+def summarize(settings, totals, frames):
+    rows = []
+    for setting, total in zip(settings, totals):
+        precision = total['tp'] / (total['tp'] + total['fp']) if total['tp'] + total['fp'] else 0.0
+        recall = total['tp'] / (total['tp'] + total['fn']) if total['tp'] + total['fn'] else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        rows.append(dict(setting, precision=precision, recall=recall, f1=f1, ms_per_frame=1000 * total['cost'] / max(frames, 1)))
+    return sorted(rows, key=lambda row: -row['f1'])
+
+
+def print_table(title, names, rows):
+    print(f"\n{title}")
+    columns = names + ['precision', 'recall', 'f1', 'ms_per_frame']
+    print("  ".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]:>12.3f}" if isinstance(row[column], float) else f"{row[column]:>12}" for column in columns))
+
+
+def main(args):
+    sign_settings = grid(args, SIGN_PARAMETERS)
+    lane_settings = grid(args, LANE_PARAMETERS)
+    sign_totals = [defaultdict(float) for _ in sign_settings]
+    lane_totals = [defaultdict(float) for _ in lane_settings]
+    frames = 0
+
+    start = time.perf_counter()
+    with Pool(args.workers, initializer=init_worker, initargs=(args,)) as pool:
+        for segment_frames, sign_results, lane_results in pool.imap_unordered(evaluate_segment, jobs(args, sign_settings, lane_settings)):
+            frames += segment_frames
+            for totals, results in ((sign_totals, sign_results), (lane_totals, lane_results)):
+                for total, result in zip(totals, results):
+                    for key, value in result.items():
+                        total[key] += value
+    print(f"{frames} frames, {len(sign_settings)} sign settings, {len(lane_settings)} lane settings in {time.perf_counter() - start:.1f} s")
+
+    sign_rows = summarize(sign_settings, sign_totals, frames)
+    lane_rows = summarize(lane_settings, lane_totals, frames)
+    print_table("Sign detection", SIGN_PARAMETERS, sign_rows)
+    print_table("Lane departure warning", LANE_PARAMETERS, lane_rows)
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump({'frames': frames, 'signs': sign_rows, 'lanes': lane_rows}, file, indent=4)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate a grid of detector parameters on labelled clips")
+    parser.add_argument('--clips', nargs='+', required=True, help="Labelled video files")
+    parser.add_argument('--min_size_components', type=int, nargs='+', default=[300], help="Min size component values to try")
+    parser.add_argument('--similitary_contour_with_circle', type=float, nargs='+', default=[0.60], help="Similarity to a circle values to try")
+    parser.add_argument('--canny_low', type=int, nargs='+', default=[130], help="Lower Canny thresholds to try")
+    parser.add_argument('--canny_high', type=int, nargs='+', default=[220], help="Upper Canny thresholds to try")
+    parser.add_argument('--hough_threshold', type=int, nargs='+', default=[10], help="Hough accumulator thresholds to try")
+    parser.add_argument('--min_line_length', type=int, nargs='+', default=[15], help="Hough min line lengths to try")
+    parser.add_argument('--max_line_gap', type=float, nargs='+', default=[2.5], help="Hough max line gaps to try")
+    parser.add_argument('--warning_threshold', type=float, nargs='+', default=[0.2], help="Lane departure thresholds to try, inside the 0.1-0.4 clamp")
+    parser.add_argument('--iou', type=float, default=0.5, help="Overlap needed for a detection to match a labelled sign")
+    parser.add_argument('--segment_frames', type=int, default=500, help="Frames per parallel job, 0 for one job per clip")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument('--compressed_model', choices=["none"] + MODES, default="none", help="Use a faster approximation of the sign classifier")
+    parser.add_argument('--compression_ratio', type=float, default=0.5, help="Fraction of support vectors kept by the compressed classifier")
+    parser.add_argument('--report', help="Write the results as JSON to this file")
+
+    args = parser.parse_args()
+    main(args)
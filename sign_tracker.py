@@ -0,0 +1,157 @@
+"Multi-object CamShift tracker for detected road signs"
+
+import math
+
+import cv2
+import numpy as np
+
+TERMINATION = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
+
+
+def hue_mask(hsv):
+    """Pixels with enough saturation and brightness for their hue to mean something."""
+    return cv2.inRange(hsv, np.array((0., 60., 32.)), np.array((180., 255., 255.)))
+
+
+def iou(a, b):
+    """Intersection over union of two (left, top, right, bottom) boxes."""
+    left = max(a[0], b[0])
+    top = max(a[1], b[1])
+    right = min(a[2], b[2])
+    bottom = min(a[3], b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def box_size(tl, br):
+    return math.sqrt(math.pow((tl[0]-br[0]),2) + math.pow((tl[1]-br[1]),2))
+
+
+def keep_tracking(previous_size, tl, br):
+    """Size and aspect checks used to stop tracking a sign that CamShift has lost."""
+    size = box_size(tl, br)
+    if previous_size < 1 or size < 1 or size / previous_size > 30 or tl[1] == br[1]:
+        return False
+    aspect = math.fabs((tl[0]-br[0])/(tl[1]-br[1]))
+    return 0.5 <= aspect <= 2
+
+
+class Track:
+    def __init__(self, track_id, frame, sign_type, text, coordinate):
+        self.track_id = track_id
+        self.sign_type = None
+        self.hist = None
+        self.reset(frame, sign_type, text, coordinate)
+
+    def reset(self, frame, sign_type, text, coordinate):
+        """Start tracking from a fresh detection."""
+        (left, top), (right, bottom) = coordinate
+        height, width = frame.shape[:2]
+        self.box = (max(int(left), 0), max(int(top), 0), min(int(right), width - 1), min(int(bottom), height - 1))
+        self.size = box_size(self.box[:2], self.box[2:])
+        if sign_type != self.sign_type or self.hist is None:
+            self.hist = self.hue_histogram(frame)
+        self.sign_type = sign_type
+        self.text = text
+
+    def hue_histogram(self, frame):
+        left, top, right, bottom = self.box
+        # Leave out the 5% border, it is usually background.
+        dx = int((right - left) * 0.05)
+        dy = int((bottom - top) * 0.05)
+        roi = frame[top + dy:bottom - dy, left + dx:right - dx]
+        if roi.size == 0:
+            return None
+        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0], hue_mask(hsv), [16], [0, 180])
+        return cv2.normalize(hist, hist, 0, 255, cv2.NORM_MINMAX)
+
+    def search_window(self, frame, padding):
+        """Box padded by `padding` times its width and height on each side, clipped to the frame."""
+        left, top, right, bottom = self.box
+        pad_x = int((right - left) * padding)
+        pad_y = int((bottom - top) * padding)
+        height, width = frame.shape[:2]
+        return max(left - pad_x, 0), max(top - pad_y, 0), min(right + pad_x, width), min(bottom + pad_y, height)
+
+    def follow(self, frame, padding):
+        """Move the box with CamShift inside the search window. Returns False once the sign is lost."""
+        if self.hist is None:
+            return False
+        x1, y1, x2, y2 = self.search_window(frame, padding)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return False
+        hsv = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2HSV)
+        backProj = cv2.calcBackProject([hsv], [0], self.hist, [0, 180], 1)
+        backProj &= hue_mask(hsv)
+
+        left, top, right, bottom = self.box
+        window = (left - x1, top - y1, max(right - left, 1), max(bottom - top, 1))
+        (r, _) = cv2.CamShift(backProj, window, TERMINATION)
+        pts = np.intp(cv2.boxPoints(r)) + (x1, y1)
+        s = pts.sum(axis = 1)
+        tl = pts[np.argmin(s)]
+        br = pts[np.argmax(s)]
+
+        if not keep_tracking(self.size, tl, br):
+            return False
+        self.size = box_size(tl, br)
+        self.box = (int(tl[0]), int(tl[1]), int(br[0]), int(br[1]))
+        return True
+
+
+class SignTracker:
+    """Keeps several signs tracked at once.
+
+    Detections are matched to tracks by IoU. Matched tracks are reset to the detection,
+    unmatched tracks are followed with CamShift on a back projection computed only in a
+    padded window around the track, so the cost grows with the number of tracks rather
+    than with the frame size.
+    """
+
+    def __init__(self, iou_threshold=0.3, padding=1.0, max_tracks=8):
+        self.iou_threshold = iou_threshold
+        self.padding = padding
+        self.max_tracks = max_tracks
+        self.tracks = []
+        self.next_id = 0
+
+    def update(self, frame, detections):
+        """Update the tracks with a list of (coordinate, sign_type, text) detections.
+
+        Returns the live tracks and the tracks created on this frame.
+        """
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for d, (coordinate, _, _) in enumerate(detections):
+                overlap = iou(track.box, (coordinate[0][0], coordinate[0][1], coordinate[1][0], coordinate[1][1]))
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, t, d))
+
+        matched_tracks = set()
+        matched_detections = set()
+        for _, t, d in sorted(pairs, reverse=True):
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            coordinate, sign_type, text = detections[d]
+            self.tracks[t].reset(frame, sign_type, text, coordinate)
+
+        live = []
+        for t, track in enumerate(self.tracks):
+            if t in matched_tracks or track.follow(frame, self.padding):
+                live.append(track)
+
+        new_tracks = []
+        for d, (coordinate, sign_type, text) in enumerate(detections):
+            if d in matched_detections or len(live) >= self.max_tracks:
+                continue
+            track = Track(self.next_id, frame, sign_type, text, coordinate)
+            self.next_id += 1
+            live.append(track)
+            new_tracks.append(track)
+
+        self.tracks = live
+        return self.tracks, new_tracks
@@ -0,0 +1,209 @@
+"Long-run soak test of the full detection pipeline with memory and latency drift tracking"
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import Sub_RSR
+
+# One hour on a recorded drive, no preview:
+# python soak.py --source drive.avi --duration 3600 --no_display
+# Recording is off unless --record is given.
+# Fail when RSS grows by more than 50 MB or p99 latency by more than 25%:
+# python soak.py --source drive.avi --max_rss_growth 50 --max_p99_growth 1.25
+
+
+class LoopingCapture:
+    """VideoCapture over a file that starts again from the first frame instead of ending."""
+
+    def __init__(self, filename):
+        self.vidcap = cv2.VideoCapture(filename)
+        if not self.vidcap.isOpened():
+            raise IOError(f"Cannot open {filename}")
+        self.read_time = None
+        self.loops = 0
+
+    def read(self):
+        success, frame = self.vidcap.read()
+        if not success:
+            self.loops += 1
+            self.vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.vidcap.read()
+        self.read_time = time.perf_counter()
+        return success, frame
+
+    def get(self, prop):
+        return self.vidcap.get(prop)
+
+    def release(self):
+        self.vidcap.release()
+
+
+def rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def open_fds():
+    if psutil is not None:
+        process = psutil.Process()
+        return process.num_handles() if os.name == 'nt' else process.num_fds()
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+class SoakMonitor:
+    """Collects per-frame latency and samples process resources at a fixed interval."""
+
+    def __init__(self, vidcap, duration, sample_interval, warmup, top_allocators):
+        self.vidcap = vidcap
+        self.duration = duration
+        self.sample_interval = sample_interval
+        self.warmup = warmup
+        self.top_allocators = top_allocators
+        self.start = time.perf_counter()
+        self.next_sample = None
+        self.latencies = []
+        self.samples = []
+        self.baseline_snapshot = None
+        self.last_snapshot = None
+
+    def __call__(self, state):
+        now = time.perf_counter()
+        self.latencies.append(now - self.vidcap.read_time)
+        if self.next_sample is None:
+            # Start measuring once caches, the model and the TTS engine are warm.
+            if now - self.start >= self.warmup:
+                self.latencies = []
+                self.next_sample = now + self.sample_interval
+        elif now >= self.next_sample:
+            self.take_sample(now, state)
+            self.next_sample = now + self.sample_interval
+        return now - self.start < self.duration
+
+    def take_sample(self, now, state):
+        snapshot = tracemalloc.take_snapshot()
+        if self.baseline_snapshot is None:
+            self.baseline_snapshot = snapshot
+        self.last_snapshot = snapshot
+        latencies = np.array(self.latencies) * 1000
+        self.latencies = []
+        self.samples.append({
+            'time': round(now - self.start, 1),
+            'frames': state.count,
+            'rss_mb': rss_mb(),
+            'traced_mb': tracemalloc.get_traced_memory()[0] / 2**20,
+            'threads': threading.active_count(),
+            'open_fds': open_fds(),
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        })
+        print("soak: " + ", ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}" for key, value in self.samples[-1].items()))
+
+    def growing_allocators(self):
+        if self.baseline_snapshot is None or self.last_snapshot is self.baseline_snapshot:
+            return []
+        stats = self.last_snapshot.compare_to(self.baseline_snapshot, 'lineno')
+        return [{'where': str(stat.traceback), 'growth_kb': stat.size_diff / 1024, 'count_growth': stat.count_diff}
+                for stat in stats[:self.top_allocators]]
+
+
+def drift_report(monitor, loops, max_rss_growth, max_p99_growth):
+    """Compare the first and last samples and check them against the bounds."""
+    samples = monitor.samples
+    report = {'samples': samples, 'loops': loops, 'top_allocators': monitor.growing_allocators(), 'failures': []}
+    if len(samples) < 2:
+        report['failures'].append("Not enough samples, run longer or lower --sample_interval")
+        return report
+    first, last = samples[0], samples[-1]
+    hours = (last['time'] - first['time']) / 3600
+    if first['rss_mb'] is not None:
+        report['rss_growth_mb'] = last['rss_mb'] - first['rss_mb']
+        times = np.array([sample['time'] for sample in samples])
+        rss = np.array([sample['rss_mb'] for sample in samples])
+        report['rss_slope_mb_per_hour'] = float(np.polyfit(times / 3600, rss, 1)[0])
+        if report['rss_growth_mb'] > max_rss_growth:
+            report['failures'].append(f"RSS grew {report['rss_growth_mb']:.1f} MB (limit {max_rss_growth} MB)")
+    report['traced_growth_mb'] = last['traced_mb'] - first['traced_mb']
+    report['thread_growth'] = last['threads'] - first['threads']
+    if first['open_fds'] is not None:
+        report['fd_growth'] = last['open_fds'] - first['open_fds']
+    if first['p99_ms'] and last['p99_ms']:
+        report['p99_ratio'] = last['p99_ms'] / first['p99_ms']
+        if report['p99_ratio'] > max_p99_growth:
+            report['failures'].append(f"p99 latency went from {first['p99_ms']:.1f} ms to {last['p99_ms']:.1f} ms (limit x{max_p99_growth})")
+    report['hours'] = hours
+    return report
+
+
+def print_report(report):
+    print("\nSoak test drift report")
+    for key in ['hours', 'loops', 'rss_growth_mb', 'rss_slope_mb_per_hour', 'traced_growth_mb', 'thread_growth', 'fd_growth', 'p99_ratio']:
+        if key in report:
+            value = report[key]
+            print(f"  {key}: {value:.2f}" if isinstance(value, float) else f"  {key}: {value}")
+    if report['top_allocators']:
+        print("  Largest allocation growth since the first sample:")
+        for allocator in report['top_allocators']:
+            print(f"    {allocator['growth_kb']:10.1f} KB {allocator['count_growth']:+8d} blocks  {allocator['where']}")
+    for failure in report['failures']:
+        print(f"  FAIL: {failure}")
+    if not report['failures']:
+        print("  PASS")
+
+
+def main(args):
+    tracemalloc.start(args.traceback_frames)
+    vidcap = LoopingCapture(args.source)
+    monitor = SoakMonitor(vidcap, args.duration, args.sample_interval, args.warmup, args.top_allocators)
+    Sub_RSR.main(args, vidcap=vidcap, on_frame=monitor)
+    tracemalloc.stop()
+
+    report = drift_report(monitor, vidcap.loops, args.max_rss_growth, args.max_p99_growth)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=4)
+    return 1 if report['failures'] else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Soak test the detection pipeline on a looping recording")
+    parser.add_argument('--source', required=True, help="Video file replayed in a loop")
+    parser.add_argument('--duration', type=float, default=3600, help="Length of the run in seconds")
+    parser.add_argument('--warmup', type=float, default=30, help="Seconds ignored before measuring starts")
+    parser.add_argument('--sample_interval', type=float, default=60, help="Seconds between resource samples")
+    parser.add_argument('--max_rss_growth', type=float, default=50, help="Fail when RSS grows more than this many MB after warmup")
+    parser.add_argument('--max_p99_growth', type=float, default=1.5, help="Fail when p99 frame latency grows more than this factor after warmup")
+    parser.add_argument('--top_allocators', type=int, default=10, help="Number of growing allocation sites to report")
+    parser.add_argument('--traceback_frames', type=int, default=1, help="Stack depth recorded by tracemalloc")
+    parser.add_argument('--report', help="Write the drift report as JSON to this file")
+    Sub_RSR.add_detection_arguments(parser)
+    # A long run would fill the disk with recordings, only save them when asked.
+    parser.add_argument('--record', dest='record', action='store_true', help="Save the annotated video like a normal run")
+    parser.set_defaults(record=False)
+
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,18 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("cv2.ml")
+
+from compressed_svm import prune_svm
+
+
+def test_prune_all_support_vectors_matches_opencv():
+    model = cv2.ml.SVM_load('data_svm.dat')
+    support_vectors = model.getSupportVectors()
+    rng = np.random.default_rng(0)
+    # HOG sized samples, around the support vectors so every class gets votes.
+    X = support_vectors[rng.integers(0, len(support_vectors), 200)] + rng.normal(0, 0.05, (200, support_vectors.shape[1]))
+    X = X.astype(np.float32)
+    compressed = prune_svm(model, 'data_svm.dat', 1.0)
+    np.testing.assert_array_equal(compressed.predict(X)[1], model.predict(X)[1])
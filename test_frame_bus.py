@@ -0,0 +1,115 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("multiprocessing.shared_memory")
+
+from frame_bus import CLOSED, FrameBus, FrameReader
+
+SHAPE = (4, 6, 3)
+
+
+def frame(seq):
+    return np.full(SHAPE, seq % 256, dtype=np.uint8)
+
+
+@pytest.fixture
+def make_bus():
+    buses = []
+
+    def make(**kwargs):
+        bus = FrameBus(f"test_{uuid.uuid4().hex[:12]}", SHAPE, **kwargs)
+        buses.append(bus)
+        return bus
+
+    yield make
+    for bus in buses:
+        bus.close()
+
+
+def test_overwrite_skips_to_oldest_frame_in_ring(make_bus):
+    bus = make_bus(slots=4, mode="overwrite")
+    reader = FrameReader(bus.name)
+    for seq in range(1, 11):
+        assert bus.publish(frame(seq), {'seq': seq}) == seq
+    seq, image, meta = reader.read(timeout=1)
+    assert seq == 7 and meta == {'seq': 7}
+    assert (image == 7).all()
+    assert reader.skipped == 6
+    assert [reader.read(timeout=1)[0] for _ in range(3)] == [8, 9, 10]
+    assert reader.read(timeout=0.01) is None
+    reader.close()
+
+
+def test_block_mode_delivers_every_frame(make_bus):
+    bus = make_bus(slots=2, mode="block", block_timeout=5)
+    reader = FrameReader(bus.name)
+    received = []
+
+    def consume():
+        while len(received) < 50:
+            seq, image, meta = reader.read(timeout=5)
+            # The producer must not overwrite the view before the next read().
+            time.sleep(0.001)
+            received.append((seq, int(image[0, 0, 0]), meta['seq']))
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    for seq in range(1, 51):
+        bus.publish(frame(seq), {'seq': seq})
+    thread.join(10)
+    assert received == [(seq, seq, seq) for seq in range(1, 51)]
+    assert reader.skipped == 0 and bus.dropped_waits == 0
+    reader.close()
+
+
+def test_stuck_reader_is_evicted_once_and_reattaches_elsewhere(make_bus):
+    bus = make_bus(slots=4, mode="block", block_timeout=0.1)
+    stuck = FrameReader(bus.name)
+    start = time.perf_counter()
+    for seq in range(1, 21):
+        bus.publish(frame(seq))
+    # Only the first wait runs into the timeout.
+    assert time.perf_counter() - start < 1.0
+    assert bus.dropped_waits == 1 and bus.evicted == 1
+
+    # A new reader takes the freed cursor, the evicted one must not share it.
+    newcomer = FrameReader(bus.name)
+    assert newcomer.consumer == stuck.consumer
+    seq, image, meta = stuck.read(timeout=1)
+    assert seq == 17 and stuck.evictions == 1
+    assert stuck.consumer != newcomer.consumer
+    assert newcomer.attached() and stuck.attached()
+    stuck.close()
+    assert newcomer.attached()
+    newcomer.close()
+
+
+def test_reader_that_lost_its_cursor_claims_another(make_bus):
+    bus = make_bus(slots=4)
+    first = FrameReader(bus.name)
+    second = FrameReader(bus.name)
+    # Two readers attaching at the same moment both picked the same free cursor, the second token won.
+    second.ring.cursors[second.consumer] = -1
+    second.consumer = first.consumer
+    second.ring.owners[second.consumer] = second.token
+    bus.publish(frame(1))
+    assert first.read(timeout=1)[0] == 1
+    assert first.evictions == 1
+    assert first.consumer != second.consumer
+    assert first.attached() and second.attached()
+    first.close()
+    second.close()
+
+
+def test_read_returns_none_once_closed(make_bus):
+    bus = make_bus()
+    reader = FrameReader(bus.name)
+    bus.publish(frame(1))
+    bus.ring.header[CLOSED] = 1
+    assert reader.read(timeout=1)[0] == 1
+    assert reader.read(timeout=1) is None
+    reader.close()